@@ -26,10 +26,12 @@ member of `dataset` object.
 
 """
 from Exposer import *
+from Planner import Planner
 from weles import Ensemble
 from weles import Dataset
 from weles import Sample
 from weles import utils
+from multiprocessing.pool import ThreadPool
 import itertools
 import random
 
@@ -53,7 +55,7 @@ class ECEApproach(Enum):
 class ECE(Ensemble):
     # ==== Preparing an ensemble
 
-    def __init__(self, dataset, selection=None, scales=None, approach = 1, votingMethod = 1, dimensions = [2], grain = 20, radius = .25, limit = 15, pool = 30, resample = 10000):
+    def __init__(self, dataset, selection=None, scales=None, approach = 1, votingMethod = 1, dimensions = [2], grain = 20, radius = .25, limit = 15, pool = 30, resample = 10000, memory = None, time = None, downscale = False, backend = None):
         Ensemble.__init__(self, dataset)
         # First, we're collecting four values from passed configuration:
         #
@@ -62,6 +64,12 @@ class ECE(Ensemble):
         # - **dimensions**, used as a vector of possible exposer
         # dimensionalities.
         # - **configuration**, used to configure _exposers_.
+        #
+        # Optionally, a budget of **memory** (in bytes) and **time** (in
+        # seconds) may be given. Configuration exceeding it is refused or, if
+        # **downscale** is set, replaced by the largest one fitting.
+        # **Backend** of _exposers_ kernels is described in
+        # _[Kernels](Kernels.html)_.
 
         self.approach = approach
         self.exposerVotingMethod = votingMethod
@@ -71,12 +79,18 @@ class ECE(Ensemble):
         self.limit = limit
         self.pool = pool
         self.resample = resample
+        self.backend = backend
 
         self.exposers = []
+        self.validation = []
+        self.queries = 0
         self.dataset = dataset
         self.selection = selection
         self.scales = scales
 
+        if memory is not None or time is not None:
+            self.budget(memory, time, downscale)
+
         # Later, we're gathering the dataset and creating empty list of
         # lambdas.
         self.combinations = self.composeEnsemble()
@@ -100,6 +114,45 @@ class ECE(Ensemble):
             resample
         )
 
+    # ### Budget
+    # Before anything is allocated, the configuration is checked against a
+    # given budget with the _[Planner](Planner.html)_.
+    def plan(self):
+        return Planner.fromDataset(
+            self.dataset, self.selection, backend = self.backend).estimate(
+            **self.configuration())
+
+    def configuration(self):
+        return {
+            'approach': self.approach,
+            'dimensions': self.dimensions,
+            'grain': self.grain,
+            'radius': self.radius,
+            'limit': self.limit,
+            'pool': self.pool,
+            'resample': self.resample
+        }
+
+    def budget(self, memory = None, time = None, downscale = False):
+        planner = Planner.fromDataset(
+            self.dataset, self.selection, backend = self.backend)
+        if planner.fits(self.plan(), memory, time):
+            return
+
+        if downscale:
+            configuration = planner.fit(
+                memory, time, **self.configuration())
+            if configuration is not None:
+                self.approach = configuration['approach']
+                self.grain = configuration['grain']
+                self.radius = configuration['radius']
+                self.limit = configuration['limit']
+                return
+
+        raise ValueError(
+            'Configuration %s exceeds budget of %s bytes and %s seconds' % (
+                self.configuration(), memory, time))
+
     def composeEnsemble(self):
         combinations = []
         given_range = range(0, self.dataset.features)
@@ -149,7 +202,8 @@ class ECE(Ensemble):
                         radius = 1,
                         votingMethod = 1,
                         chosenLambda = combination,
-                        resample = self.resample
+                        resample = self.resample,
+                        backend = self.backend
                     )
                     for combination in combinations
                 ]
@@ -198,10 +252,21 @@ class ECE(Ensemble):
         #print combinations
         return combinations
 
-    def learn(self):
+    def learn(self, validation=0., jobs=1):
         # print 'Learning ECE'
         self.dataset.clearSupports()
         self.exposers = []
+
+        # Optionally, a `validation` fraction of training samples is held out
+        # from exposing, to be later used for pruning.
+        samples = self.dataset.samples
+        holdout = set(random.sample(
+            range(len(samples)), int(validation * len(samples))))
+        self.validation = [
+            sample for i, sample in enumerate(samples) if i in holdout]
+        samples = [
+            sample for i, sample in enumerate(samples) if i not in holdout]
+
         for idx, combination in enumerate(self.combinations):
             # print 'Preparing exposer %i / %i' % (idx, len(self.combinations))
             e = Exposer(
@@ -211,25 +276,127 @@ class ECE(Ensemble):
                 votingMethod = self.exposerVotingMethod,
                 grain = self.grain,
                 radius = self.radius,
-                resample = self.resample
+                resample = self.resample,
+                backend = self.backend
             )
             #print e
-            #exposerConfiguration = {'chosenLambda': chosen_lambda}
-            #exposerConfiguration.update(self.configuration)
-            #exposer = Exposer(self.dataset, exposerConfiguration, self.scales)
-            # print 'Exposing exposer'
-            e.learn()
             self.exposers.append(e)
+
+        # Features of samples are gathered once for all exposers, and every
+        # exposer draws its resampled indexes in order, so seeded learning
+        # gives the same ensemble for any number of `jobs`.
+        features = featureMatrix(samples, self.dataset.features)
+        labels = np.array([sample.label for sample in samples], dtype=np.int64)
+        resamplers = [e.resampler(len(samples)) for e in self.exposers]
+
+        # Exposers may be learned in a number of parallel `jobs`. Compiled
+        # kernels release the GIL, so threads are enough.
+        def learn(i):
+            # print 'Exposing exposer'
+            self.exposers[i].learnArrays(features, labels, resamplers[i])
+
+        if jobs > 1:
+            pool = ThreadPool(jobs)
+            pool.map(learn, xrange(len(self.exposers)))
+            pool.close()
+            pool.join()
+        else:
+            for i in xrange(len(self.exposers)):
+                learn(i)
         #print self.exposers
 
+    # ### Pruning
+    # After learning, ensemble may be pruned from members which add nothing
+    # over the others. Exposers are visited in order of increasing `theta` and
+    # every one is dropped, as long as the accuracy of remaining ensemble on
+    # a validation set does not fall more than `tolerance` below the accuracy
+    # of a complete ensemble. By default, samples held out during learning
+    # are used for validation, so without them a `validation` set has to be
+    # given.
+    def prune(self, tolerance=.01, validation=None):
+        if validation is None:
+            if not self.validation:
+                raise ValueError(
+                    'Pruning requires samples held out during learning '
+                    'or a validation set')
+            validation = self.validation
+
+        labels = np.array([sample.label for sample in validation])
+        votes = dict(
+            (exposer, exposer.votes(validation)) for exposer in self.exposers)
+
+        def accuracy(exposers):
+            support = sum(votes[exposer] for exposer in exposers)
+            return np.mean(np.argmax(support, axis=1) == labels)
+
+        baseline = accuracy(self.exposers)
+        kept = list(self.exposers)
+        for exposer in sorted(self.exposers, key=lambda e: e.theta):
+            if len(kept) == 1:
+                break
+            candidate = [e for e in kept if e is not exposer]
+            if accuracy(candidate) >= baseline - tolerance:
+                kept = candidate
+
+        self.exposers = kept
+        self.combinations = [exposer.chosenLambda for exposer in kept]
+        return accuracy(kept)
+
     # ### Prediction
     # Prediction in this case is just creating and configuring exposer for
     # every combination from a list and performing the prediction for every
     # member.
-    def predict(self):
+    #
+    # In a **cascade** mode, exposers are queried in order of decreasing
+    # `theta` and prediction for a sample stops, as soon as its leading class
+    # can not be overturned by the highest supports the remaining members may
+    # give. Decisions are the same as for a complete ensemble, but supports
+    # are accumulated only from queried members. Total number of queries is
+    # stored in `queries`.
+    def predict(self, cascade=False):
         self.dataset.clearSupports()
-        for exposer in self.exposers:
-            exposer.predict()
+        if not cascade:
+            for exposer in self.exposers:
+                exposer.predict()
+            self.queries = len(self.exposers) * len(self.dataset.test)
+            return
+
+        exposers = sorted(
+            self.exposers, key=lambda exposer: exposer.theta, reverse=True)
+
+        # Remaining supports are cumulated from the end of a cascade, so the
+        # `i`-th row is the highest support possible after `i` queries.
+        remaining = np.zeros((len(exposers) + 1, len(self.dataset.classes)))
+        for i in xrange(len(exposers) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + exposers[i].voteBound()
+
+        # Every exposer votes at once for all samples, which are still
+        # undecided.
+        test = self.dataset.test
+        features = featureMatrix(test, self.dataset.features)
+        supports = np.zeros((len(test), len(self.dataset.classes)))
+        undecided = np.ones(len(test), dtype=bool)
+
+        self.queries = 0
+        for i, exposer in enumerate(exposers):
+            indexes = np.flatnonzero(undecided)
+            if len(indexes) == 0:
+                break
+            supports[indexes] += exposer.votesFor(
+                features[indexes][:, list(exposer.chosenLambda)])
+            self.queries += len(indexes)
+
+            support = supports[indexes]
+            leaders = np.argmax(support, axis=1)
+            rivals = support + remaining[i + 1]
+            rivals[np.arange(len(indexes)), leaders] = -np.inf
+            decided = support[np.arange(len(indexes)), leaders] > \
+                np.max(rivals, axis=1)
+            undecided[indexes[decided]] = False
+
+        for sample, support in zip(test, supports):
+            sample.support += support
+            sample.decidePrediction()
 
     def generatePNGs(self, prefix='exposer_'):
         i = 0
@@ -31,6 +31,7 @@ Dictionary with scores is provided by a function `score()` being a member of
 
 
 from weles import Classifier
+from Kernels import kernels
 
 from enum import Enum
 
@@ -62,11 +63,18 @@ class ExposerVotingMethod(Enum):
     thetas = 5
 
 
+# Matrix of all features of given samples, one row per sample.
+def featureMatrix(samples, features):
+    return np.array(
+        [sample.features for sample in samples], dtype=float
+    ).reshape(len(samples), features)
+
+
 # === _Exposer_ ===
 class Exposer(Classifier):
     # ==== Preparing an _exposer_ ====
 
-    def __init__(self, dataset, chosenLambda, scales = None, votingMethod = 1, grain = 20, radius = .25, resample = 10000):
+    def __init__(self, dataset, chosenLambda, scales = None, votingMethod = 1, grain = 20, radius = .25, resample = 10000, backend = None):
         Classifier.__init__(self, dataset)
         # First, we're collecting four values from passed configuration:
         #
@@ -74,13 +82,18 @@ class Exposer(Classifier):
         # - **grain**, used as a number of quants in every dimension,
         # - **radius**, used as percentage range of influence generated by
         # every data sample,
-        # - **chosen lambda**, a set of features describing the subspace.
+        # - **chosen lambda**, a set of features describing the subspace,
+        # - **backend**, used to run kernels, described in
+        # _[Kernels](Kernels.html)_.
         self.exposerVotingMethod = votingMethod
         self.grain = grain
         self.radius = radius
         self.chosenLambda = chosenLambda
         self.scales = scales
         self.resample = resample
+        self.backend = backend
+        self.dropKernel, self.exposeKernel, self.normalizeKernel, \
+            self.measureKernel, self.locateKernel = kernels(backend)
 
         self.thetas = None
 
@@ -93,11 +106,12 @@ class Exposer(Classifier):
         self.g = [1] * self.dimensions
         for i in xrange(1, self.dimensions):
             self.g[i] = self.g[i - 1] * self.grain
+        self.g = np.array(self.g, dtype=np.int64)
 
         # To optimize time of computing a single sample influence, we prepare
-        # the set of base move-vectors for given `radius`, with precalculated
-        # distance to a central point.
-        self.dropVectors = self.dropVectors()
+        # the set of base move-vectors (`offsets`) for given `radius`, with
+        # precalculated `influences` depending on distance to a central point.
+        self.offsets, self.influences = self.dropVectors()
 
     def __str__(self):
         return 'exposer_ds_%s_g_%i_r_%i_t_%s' % (
@@ -105,7 +119,27 @@ class Exposer(Classifier):
         )
 
     # === Learning ===
-    def learn(self):
+    def learn(self, samples=None):
+        # By default, _exposer_ learns from every training sample of dataset,
+        # but a custom subset (i.e. with a validation split held out) may be
+        # passed.
+        if samples is None:
+            samples = self.dataset.samples
+
+        self.learnArrays(
+            featureMatrix(samples, self.dataset.features),
+            self.labels(samples), self.resampler(len(samples)))
+
+    def resampler(self, count):
+        # If a number of samples exceeds `resample`, only a random subset of
+        # them is exposed. Indexes are drawn apart from learning, so an
+        # ensemble may draw them in order, before learning in parallel.
+        #print '%i is the value of resample' % self.resample
+        if self.resample < count:
+            return np.array(sorted(random.sample(range(count), self.resample)))
+        return None
+
+    def learnArrays(self, features, labels, resampler=None):
         # It gives us enough information to create an empty `matrix` which will
         # store all the information in our _exposer_. Abstraction of
         # n-dimensional array of _pixels_ is realized by the one dimensional
@@ -117,68 +151,42 @@ class Exposer(Classifier):
         self.model = np.zeros((width, len(self.dataset.classes)))
         self.hsv = np.zeros((width, 3))
 
-        #print '%i is the value of resample' % self.resample
-        if self.resample < len(self.dataset.samples):
-            resampler = random.sample(range(len(self.dataset.samples)), self.resample)
-            #print '%i is a number of indexes in resampler' % len(resampler)
-            #print resampler
-            # ==== Exposing array on a beam of samples ====
-            #a = 0
-            for i, sample in enumerate(self.dataset.samples):
-                if i in resampler:
-                    self.expose(sample)
-                    #a += 1
-            #print '%i samples analysed' % a
-        else:
-            # ==== Exposing array on a beam of samples ====
-            for sample in self.dataset.samples:
-                self.expose(sample)
+        # Learning uses a matrix of all features of samples, from which
+        # resampled rows and columns of `chosenLambda` are taken.
+        if resampler is not None:
+            features = features[resampler]
+            labels = labels[resampler]
+        features = features[:, list(self.chosenLambda)]
 
+        # ==== Exposing array on a beam of samples ====
+        # Scales are applied after every exposed sample, so in such case
+        # samples are exposed one by one.
+        if self.scales:
+            for i in xrange(len(features)):
+                self.exposeKernel(
+                    self.model, features[i:i + 1], labels[i:i + 1],
+                    self.offsets, self.influences, self.grain, self.g)
+                for index, value in enumerate(self.model):
+                    self.model[index] *= self.scales
+        else:
+            self.exposeKernel(
+                self.model, features, labels,
+                self.offsets, self.influences, self.grain, self.g)
 
         self.normalize()
         self.calculate_measures()
 
     def expose(self, sample):
         # For every `sample` in a `dataset`, we read its `label` and a
-        # subset of its `features` for `chosenLambda`.
-        label = sample.label
-        features = [sample.features[index] for index in self.chosenLambda]
-
-        # Ignore samples with missing values
-        if np.isnan(features).any():
-            pass
-
-        # According to `features`, we `establish` a `location` of point in
-        # exposers space, corresponding to processed `sample`.
-        location = np.array(features) * self.grain
-        location_i = (location).astype(int)
-
-        # The euclidean distance between quantified (`location_i`) and
-        # exact location (`location_f`) lets us to establish a `factor`
-        # used to correct distances comming from base vectors.
-        distance = np.linalg.norm(location_i-location)
-        factor = 5 - distance
-
-        # Now we can iterate every `dropVector`.
-        for dropVector in self.dropVectors:
-            # Simple addition between quantified location and a drop vector
-            # gives us a real location (`vector`), where the influence will
-            # be placed.
-            vector = map(operator.add, dropVector[0], location_i)
-
-            # Thus the real location may overflow the space of _exposer_,
-            # we need to deal with it by checking if its value fits in
-            # range of model.
-            if any(v < 0 or v >= self.grain for v in vector):
-                continue
-
-            # Finally, we can calculate the real `influence` as a product
-            # of drop vector distance from central point and precalculated
-            # factor. After calculating its index for single-dimension
-            # representation, it is added to matrix at row corresponding
-            # to a sample `label`.
-            position = self.position(vector)
-            self.model[position][label] += dropVector[1] * factor
+        # subset of its `features` for `chosenLambda`. Samples with missing
+        # values are ignored. According to `features`, kernel establishes a
+        # `location` of point in exposers space and, for every drop vector
+        # fitting in range of model, adds its influence, corrected by a
+        # distance between quantified and exact location, to a row
+        # corresponding to a sample `label`.
+        self.exposeKernel(
+            self.model, self.features([sample]), self.labels([sample]),
+            self.offsets, self.influences, self.grain, self.g)
 
         if self.scales:
             for index, value in enumerate(self.model):
@@ -187,61 +195,63 @@ class Exposer(Classifier):
     # === Prediction ===
     def predict(self):
         #print '# Predicting at %s' % self
-        for sample in self.dataset.test:
-            #print '# Prediction for sample %s' % sample
-            #print '# Features:'
-            #print sample.getFeatures()
-            #print sample.features
-            # To predict a class for a `sample` from a test set, we read a
-            # subset of its features for chosen lambda and calculate a
-            # corresponding location for existing _exposer_.
-            features = np.array(
-                [sample.features[index] for index in self.chosenLambda])
-
-            #print '# Subset of features'
-            #print features
-
-            # Place .5 instead missing values for prediction.
-            features[np.isnan(features)] = .5
-
-            # Establish location
-            location = [
-                int(feature * self.grain) if feature < 1 else self.grain - 1
-                for feature in features]
-
-            #print '# Location of subset'
-            #print location
-
-            # Corrected location makes possible to calculate `position` of
-            # testing sample in single-dimension representation, which lets us
-            # to gather the corresponding `support` vector.
-            position = self.position(location)
-            support = self.model[position]
-            saturation = self.hsv[position][1]
-
+        votes = self.votes(self.dataset.test)
+        for sample, vote in zip(self.dataset.test, votes):
             # Finally, we demand on `sample` to establish a prediction,
             # according to its accumulated support vector.
-            vote = {
-                1:
-                    support,
-                2:
-                    self.theta * np.array(support),
-                3:
-                    map(operator.mul, self.thetas, support),
-                4:
-                    self.theta * np.array(
-                        map(operator.mul, self.thetas, support)),
-                5:
-                    saturation * self.theta * np.array(
-                        map(operator.mul, self.thetas, support))
-            }[self.exposerVotingMethod]
-
-            #print '# VOTE'
-            #print vote
-            #exit()
             sample.support += vote
             sample.decidePrediction()
 
+    # ==== Votes for samples ====
+    def votes(self, samples):
+        # To predict a class for a `sample`, we read a subset of its features
+        # for chosen lambda.
+        return self.votesFor(self.features(samples))
+
+    def votesFor(self, features):
+        # For an array of features of chosen lambda, we calculate
+        # a corresponding `position` of location in existing _exposer_, which
+        # lets us to gather the corresponding `support` vector. Missing values
+        # are placed in the middle of range.
+        positions = self.locateKernel(features, self.grain, self.g)
+        support = self.model[positions]
+        saturation = self.hsv[positions, 1][:, np.newaxis]
+
+        # The support is weighted according to the voting method.
+        thetas = np.array(self.thetas)
+        return {
+            1:
+                support,
+            2:
+                self.theta * support,
+            3:
+                thetas * support,
+            4:
+                self.theta * (thetas * support),
+            5:
+                saturation * self.theta * (thetas * support)
+        }[self.exposerVotingMethod]
+
+    # ==== Upper bound of a vote ====
+    def voteBound(self):
+        # The highest support _exposer_ may give to every class, used to
+        # decide if the remaining members of an ensemble are able to change
+        # its decision. Saturation never exceeds `1`, so the fifth voting
+        # method shares its bound with the fourth one.
+        support = np.amax(self.model, axis=0)
+        return np.array({
+            1:
+                support,
+            2:
+                self.theta * support,
+            3:
+                np.array(self.thetas) * support,
+            4:
+                self.theta * np.array(self.thetas) * support,
+            5:
+                self.theta * np.array(self.thetas) * support
+        }[self.exposerVotingMethod])
+
     # ---
 
     # === Helpers ===
@@ -259,46 +269,21 @@ class Exposer(Classifier):
     def dropVectors(self):
         # As it was said before, to optimize time of calculating single sample
         # influence, we prepare a set of base move-vectors located in given
-        # radius around centre point.
-        base_vectors = []
-        centre = [0] * self.dimensions
-
-        # We need to calculate quantified radius according to percentage radius
-        # in given number of quants. It makes possible to calculate a diameter
-        # and a beginning (in abstraction, a top left) drop vector position.
-        radius = int(self.radius * self.grain)
-        diameter = 2 * radius + 1
-        beginning = [- radius] * self.dimensions
-
-        # We use two helping vectors (`v` and `z`) to calculate relative
-        # position of point.
-        v = [-1] * self.dimensions
-        z = [1] * self.dimensions
-
-        for i in xrange(1, self.dimensions):
-            z[i] = z[i - 1] * diameter
-
-        # And iterate all points in range.
-        for i in xrange(0, pow(diameter, self.dimensions)):
-            for j in xrange(0, self.dimensions):
-                if i % z[j] == 0:
-                    v[j] += 1
-                if v[j] == diameter:
-                    v[j] = 0
-            point = map(operator.add, v, beginning)
-
-            # For every point we calculate euclidian distance between it and a
-            # centre point.
-            distance = np.linalg.norm(np.array(centre)-point)
-
-            # If the distance is lower than quantified radius, we extend the
-            # base vector list with a tuple of location and influence, computed
-            # as dequantified difference between the two compared values.
-            if distance < radius:
-                base_vectors.append(
-                    (list(point), (radius - distance) / radius))
-
-        return base_vectors
+        # radius around centre point. Radius is quantified according to
+        # percentage radius in given number of quants and every point of a
+        # hypercube with corresponding diameter is checked. Influence of a
+        # vector is computed as dequantified difference between the radius and
+        # its distance to the centre.
+        return self.dropKernel(self.dimensions, self.grain, self.radius)
+
+    # ==== Samples to arrays ====
+    def features(self, samples):
+        return featureMatrix(samples, self.dataset.features)[
+            :, list(self.chosenLambda)]
+
+    def labels(self, samples):
+        return np.array(
+            [sample.label for sample in samples], dtype=np.int64)
 
     """
 #### Visualization
@@ -366,37 +351,10 @@ lambda of `[2, 3]` for `1.0` radius and grain of `256` quants.
         # value from cone-response vector and S is a product of dividing delta
         # by V. To receive a delta for situations, where we have different
         # number of base colors than three, we are simply dividing index of
-        # maximal value by a number of classes.
-
+        # maximal value by a number of classes. Every class measure comes from
+        # a number of pixels with value over `treshold`, where it dominates.
         treshold = .7
-        self.thetas = [0] * len(self.dataset.classes)
-        thetas_count = [1] * len(self.dataset.classes)
-
-        presence = np.array([0.] * len(self.dataset.classes))
-
-        for index, pixel in enumerate(self.model):
-            cmax = np.max(pixel)
-            cmax_i = np.argmax(pixel)
-            cmin = np.min(pixel)
-            cmin_i = np.argmin(pixel)
-            delta = cmax - cmin
-
-            hue = float(cmax_i) / len(self.dataset.classes)
-
-            if hue != 0:
-                a = np.array(xrange(1, len(self.dataset.classes) + 1, 1))
-                foo = map(operator.mul, a, pixel)
-                u = sum(pixel)
-
-            saturation = 0
-            if cmax != 0:
-                saturation = delta / cmax
-            value = cmax
-
-            self.hsv[index] = (hue, saturation, value)
-
-            if value > treshold:
-                presence[cmax_i] += 1
+        presence = self.measureKernel(self.model, self.hsv, treshold)
 
         presence /= sum(presence)
         self.thetas = ([1] * len(self.dataset.classes)) - presence
@@ -408,5 +366,4 @@ lambda of `[2, 3]` for `1.0` radius and grain of `256` quants.
         # ==== Matrix normalization ====
 
         # We normalize values of each class in range (0,1).
-        foo = np.amax(self.model, axis=0)
-        self.model /= foo
+        self.normalizeKernel(self.model)
@@ -0,0 +1,253 @@
+"""
+**Kernels** are the innermost loops of an _exposer_: enumeration of drop
+vectors, exposing a model on a beam of samples, its normalization and
+measures, and locating samples in it.
+Every kernel has a reference implementation in NumPy and, as long as `numba`
+is installed, a compiled one. Compiled kernels release the GIL, so _exposers_
+may be learned in parallel threads.
+
+### Usage
+
+Backend is chosen while creating an _exposer_ or an ensemble. By default, the
+compiled one is used if it is available. `numba` is an optional dependency,
+installed with the `numba` extra (`pip install ece[numba]`), pinned to the last
+release supporting Python 2.
+
+    exposer = Exposer(dataset, chosenLambda = [0, 2], backend = ExposerBackend.numpy)
+
+"""
+
+from enum import Enum
+
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+"""
+### _Exposer_ backend
+
+- `numpy` - reference implementation,
+- `numba` - kernels compiled with `numba`.
+
+"""
+
+
+class ExposerBackend(Enum):
+    numpy = 1
+    numba = 2
+
+
+# === Reference kernels ===
+
+# ==== Drop vectors ====
+def numpyDropVectors(dimensions, grain, radius):
+    # We enumerate every point of a hypercube with a side of `diameter`,
+    # with the first coordinate changing fastest, and keep those closer to
+    # the centre than quantified radius, together with their influence.
+    radius = int(radius * grain)
+    diameter = 2 * radius + 1
+    z = diameter ** np.arange(dimensions)
+
+    points = (np.arange(diameter ** dimensions)[:, np.newaxis] // z) % \
+        diameter - radius
+    distances = np.sqrt(np.sum(points * points, axis=1).astype(float))
+
+    mask = distances < radius
+    return points[mask], (radius - distances[mask]) / radius
+
+
+# ==== Exposing ====
+def numpyExpose(model, features, labels, offsets, influences, grain, g):
+    for n in range(len(features)):
+        # Samples with missing values are ignored.
+        if np.isnan(features[n]).any():
+            continue
+
+        location = features[n] * grain
+        location_i = location.astype(int)
+
+        distance = 0.
+        for difference in location_i - location:
+            distance += difference * difference
+        factor = 5 - math.sqrt(distance)
+
+        vectors = offsets + location_i
+        mask = np.all((vectors >= 0) & (vectors < grain), axis=1)
+        positions = np.dot(vectors[mask], g)
+        model[positions, labels[n]] += influences[mask] * factor
+
+
+# ==== Normalization ====
+def numpyNormalize(model):
+    # We normalize values of each class in range (0,1).
+    with np.errstate(invalid='ignore', divide='ignore'):
+        model /= np.amax(model, axis=0)
+
+
+# ==== Measures ====
+def numpyMeasure(model, hsv, treshold):
+    # HSV representation of every pixel is stored in `hsv` and a number of
+    # pixels with value over `treshold`, for every dominating class, is
+    # returned.
+    classes = model.shape[1]
+    cmax = np.max(model, axis=1)
+    cmax_i = np.argmax(model, axis=1)
+    cmin = np.min(model, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hsv[:, 0] = cmax_i / float(classes)
+        hsv[:, 1] = np.where(cmax != 0, (cmax - cmin) / cmax, 0.)
+        hsv[:, 2] = cmax
+        present = cmax > treshold
+
+    return np.bincount(cmax_i[present], minlength=classes).astype(float)
+
+
+# ==== Locating ====
+def numpyLocate(features, grain, g):
+    # Missing values are replaced by `.5` and values out of range are
+    # located in the last quant.
+    features = np.where(np.isnan(features), .5, features)
+    location = np.where(
+        features < 1, (features * grain).astype(int), grain - 1)
+    return np.dot(location, g)
+
+
+# === Compiled kernels ===
+if numba is not None:
+    @numba.njit(nogil=True)
+    def numbaDropVectors(dimensions, grain, radius):
+        radius = int(radius * grain)
+        diameter = 2 * radius + 1
+        count = diameter ** dimensions
+
+        points = np.empty((count, dimensions), np.int64)
+        influences = np.empty(count)
+        kept = 0
+        for i in range(count):
+            z = 1
+            distance = 0.
+            for j in range(dimensions):
+                points[kept, j] = (i // z) % diameter - radius
+                distance += points[kept, j] * points[kept, j]
+                z *= diameter
+            distance = math.sqrt(distance)
+            if distance < radius:
+                influences[kept] = (radius - distance) / radius
+                kept += 1
+
+        return points[:kept].copy(), influences[:kept].copy()
+
+    @numba.njit(nogil=True)
+    def numbaExpose(model, features, labels, offsets, influences, grain, g):
+        dimensions = features.shape[1]
+        location = np.empty(dimensions)
+        location_i = np.empty(dimensions, np.int64)
+        for n in range(features.shape[0]):
+            if np.isnan(features[n]).any():
+                continue
+
+            distance = 0.
+            for j in range(dimensions):
+                location[j] = features[n, j] * grain
+                location_i[j] = int(location[j])
+                difference = location_i[j] - location[j]
+                distance += difference * difference
+            factor = 5 - math.sqrt(distance)
+
+            for k in range(offsets.shape[0]):
+                position = 0
+                inside = True
+                for j in range(dimensions):
+                    v = offsets[k, j] + location_i[j]
+                    if v < 0 or v >= grain:
+                        inside = False
+                        break
+                    position += v * g[j]
+                if inside:
+                    model[position, labels[n]] += influences[k] * factor
+
+    @numba.njit(nogil=True, error_model='numpy')
+    def numbaNormalize(model):
+        for j in range(model.shape[1]):
+            cmax = model[0, j]
+            for i in range(model.shape[0]):
+                if model[i, j] > cmax or np.isnan(model[i, j]):
+                    cmax = model[i, j]
+                    if np.isnan(cmax):
+                        break
+            for i in range(model.shape[0]):
+                model[i, j] /= cmax
+
+    @numba.njit(nogil=True, error_model='numpy')
+    def numbaMeasure(model, hsv, treshold):
+        classes = model.shape[1]
+        presence = np.zeros(classes)
+        for i in range(model.shape[0]):
+            # Missing values propagate like in NumPy, so the first of them
+            # is taken as maximum and minimum.
+            cmax = model[i, 0]
+            cmax_i = 0
+            cmin = model[i, 0]
+            for j in range(classes):
+                if np.isnan(model[i, j]):
+                    cmax = cmin = model[i, j]
+                    cmax_i = j
+                    break
+                if model[i, j] > cmax:
+                    cmax = model[i, j]
+                    cmax_i = j
+                if model[i, j] < cmin:
+                    cmin = model[i, j]
+
+            hsv[i, 0] = cmax_i / float(classes)
+            hsv[i, 1] = (cmax - cmin) / cmax if cmax != 0 else 0.
+            hsv[i, 2] = cmax
+            if cmax > treshold:
+                presence[cmax_i] += 1
+        return presence
+
+    @numba.njit(nogil=True)
+    def numbaLocate(features, grain, g):
+        positions = np.zeros(features.shape[0], np.int64)
+        for n in range(features.shape[0]):
+            for j in range(features.shape[1]):
+                feature = features[n, j]
+                if np.isnan(feature):
+                    feature = .5
+                if feature < 1:
+                    positions[n] += int(feature * grain) * g[j]
+                else:
+                    positions[n] += (grain - 1) * g[j]
+        return positions
+
+
+# ==== Backend selection ====
+def resolve(backend=None):
+    # Returns a value of a given backend, or of the best available one.
+    if backend is None:
+        return 1 if numba is None else 2
+    if backend == ExposerBackend.numpy.value or \
+            backend == ExposerBackend.numpy:
+        return ExposerBackend.numpy.value
+    if backend == ExposerBackend.numba.value or \
+            backend == ExposerBackend.numba:
+        if numba is None:
+            raise ImportError('numba backend requires numba to be installed')
+        return ExposerBackend.numba.value
+    raise ValueError('Unknown backend %s' % backend)
+
+
+def kernels(backend=None):
+    # Returns a tuple of drop vectors, exposing, normalization, measures and
+    # locating kernels for a given backend, or for the best available one.
+    if resolve(backend) == ExposerBackend.numba.value:
+        return numbaDropVectors, numbaExpose, numbaNormalize, \
+            numbaMeasure, numbaLocate
+    return numpyDropVectors, numpyExpose, numpyNormalize, \
+        numpyMeasure, numpyLocate
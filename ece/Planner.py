@@ -0,0 +1,274 @@
+"""
+**Planner** estimates the cost of an _exposer_ ensemble before it is built.
+Every _exposer_ allocates a float64 matrix of `grain^d` pixels for every class
+and enumerates `diameter^d` points to prepare its drop vectors, so a wrong pair
+of `dimensions` and `grain` may easily exhaust memory or run for hours.
+
+### Usage
+
+To create a plan, all you need is a dataset and a configuration, given the same
+way as for an ensemble.
+
+    dataset = Dataset('data/iris.csv','iris')
+    planner = Planner.fromDataset(dataset)
+    plan = planner.estimate(dimensions = [2, 3], grain = 20, limit = 15)
+
+Planner may also choose the largest configuration fitting into a given budget
+of memory (in bytes) and time (in seconds).
+
+    configuration = planner.fit(memory = 2 ** 30, time = 60, grain = 50)
+
+"""
+
+from Kernels import resolve
+
+import Kernels
+
+import math
+import operator
+
+# Size of a single value in _exposer_ matrices.
+FLOAT = 8
+
+# Times (in seconds) of work done in the interpreter, whatever the backend:
+# creating and preparing a single exposer, gathering a single feature value of
+# a sample and accumulating a single vote of exposer in a testing sample.
+EXPOSER = 1e-4
+GATHER = 2.5e-8
+VOTE = 4e-6
+
+# Times (in seconds) of kernels for every backend: overhead of exposing a
+# single sample, a single step of exposing or enumerating stencil, and
+# normalizing and measuring a single class of a pixel. Calibrated against
+# measured learning on bundled datasets.
+COSTS = {
+    1: {'sample': 2.5e-5, 'step': 8e-8, 'pixel': 6e-8},
+    2: {'sample': 5e-7, 'step': 6e-9, 'pixel': 6e-9}
+}
+
+# Time (in seconds) of compiling a single numba kernel on its first call.
+COMPILE = .5
+
+# Grain and radius used to build a pool of the heuristic approach.
+POOL_GRAIN = 5
+POOL_RADIUS = 1
+
+
+# === Planner ===
+class Planner(object):
+    # ==== Preparing a planner ====
+
+    def __init__(self, samples, features, classes, test = 0, costs = None, backend = None):
+        # Planner needs only a shape of the dataset:
+        #
+        # - **samples**, a number of training samples,
+        # - **features**, a number of features (or a length of selection),
+        # - **classes**, a number of classes,
+        # - **test**, a number of testing samples,
+        # - **costs**, times of kernel work, used to translate estimated
+        # operations into time. By default, they depend on the **backend**,
+        # described in _[Kernels](Kernels.html)_.
+        self.samples = samples
+        self.features = features
+        self.classes = classes
+        self.test = test
+        self.backend = resolve(backend)
+        self.costs = costs if costs is not None else COSTS[self.backend]
+
+    @classmethod
+    def fromDataset(cls, dataset, selection = None, costs = None, backend = None):
+        return cls(
+            samples = len(dataset.samples),
+            features = len(selection) if selection else dataset.features,
+            classes = len(dataset.classes),
+            test = len(dataset.test),
+            costs = costs,
+            backend = backend
+        )
+
+    # ==== Stencil of drop vectors ====
+    def stencil(self, dimension, grain, radius):
+        # Drop vectors are gathered by enumerating every point of a hypercube
+        # with a side of `diameter`, but only those inside a hypersphere of
+        # quantified radius are kept. Their number is estimated from a volume
+        # of the hypersphere.
+        radius = int(radius * grain)
+        diameter = 2 * radius + 1
+        points = diameter ** dimension
+        volume = math.pow(math.pi, dimension / 2.) / \
+            math.gamma(dimension / 2. + 1) * radius ** dimension
+        return points, min(points, int(volume))
+
+    # ==== Single exposer ====
+    def exposer(self, dimension, grain, radius, resample = 10000):
+        points, drops = self.stencil(dimension, grain, radius)
+        pixels = grain ** dimension
+
+        # Memory is taken by the model and its HSV representation, together
+        # with kept drop vectors and their influences. While drop vectors are
+        # prepared, the whole stencil is enumerated, with a few temporary
+        # arrays of its size.
+        memory = pixels * (self.classes + 3) * FLOAT + \
+            drops * (dimension + 1) * FLOAT
+        transient = points * (2 * dimension + 3) * FLOAT
+
+        # Learning prepares an exposer, enumerates the stencil, exposes every
+        # sample with every drop vector and visits every pixel to normalize
+        # it and calculate measures.
+        exposed = min(resample, self.samples)
+        training = EXPOSER + \
+            points * dimension * self.costs['step'] + \
+            exposed * (self.costs['sample'] + drops * self.costs['step']) + \
+            pixels * self.classes * self.costs['pixel']
+
+        # Prediction gathers features of every testing sample and adds
+        # a vote of exposer to its support.
+        prediction = self.test * (self.features * GATHER + VOTE)
+
+        return {
+            'memory': memory,
+            'transient': transient,
+            'stencil': points,
+            'drops': drops,
+            'training': training,
+            'prediction': prediction
+        }
+
+    # ==== Whole ensemble ====
+    def estimate(self, approach = 1, dimensions = [2], grain = 20, radius = .25, limit = 15, pool = 30, resample = 10000):
+        # Every possible combination of features is described by an estimate
+        # of its _exposer_. For random and heuristic approaches, the ensemble
+        # is limited, so we conservatively assume that the most expensive
+        # combinations are chosen.
+        members = self.members(dimensions, grain, radius, resample)
+        if not approach == 1:  # Not brutal
+            members = self.largest(members, limit)
+
+        # Features of training samples are gathered once for an ensemble.
+        gather = self.samples * self.features * GATHER
+
+        plan = {
+            'exposers': sum(count for count, m in members),
+            'exposerMemory': max(
+                [m['memory'] + m['transient'] for c, m in members] or [0]),
+            'stencil': max([m['stencil'] for c, m in members] or [0]),
+            'memory': sum(count * m['memory'] for count, m in members) +
+            max([m['transient'] for c, m in members] or [0]),
+            'training': gather + sum(
+                count * m['training'] for count, m in members),
+            'prediction': sum(
+                count * m['prediction'] for count, m in members)
+        }
+
+        # Kernels not compiled yet are compiled during the first learning and
+        # prediction.
+        plan['training'] += self.compilation(
+            'numbaDropVectors', 'numbaExpose', 'numbaNormalize', 'numbaMeasure')
+        plan['prediction'] += self.compilation('numbaLocate')
+
+        # Heuristic approach learns the whole pool of coarse exposers first.
+        if approach == 3:
+            candidates = self.largest(self.members(
+                dimensions, POOL_GRAIN, POOL_RADIUS, resample), pool)
+            plan['memory'] = max(plan['memory'], sum(
+                count * c['memory'] for count, c in candidates) +
+                max([c['transient'] for count, c in candidates] or [0]))
+            plan['training'] += sum(
+                count * (c['training'] + gather) for count, c in candidates)
+
+        return plan
+
+    # ==== Fitting into a budget ====
+    def fits(self, plan, memory = None, time = None):
+        if memory is not None and plan['memory'] > memory:
+            return False
+        if time is not None and \
+                plan['training'] + plan['prediction'] > time:
+            return False
+        return True
+
+    def fit(self, memory = None, time = None, approach = 1, dimensions = [2], grain = 20, radius = .25, limit = 15, pool = 30, resample = 10000):
+        # Starting from a given configuration, we are looking for the largest
+        # one fitting in budget. Memory is driven mostly by `grain`, so it is
+        # lowered first while memory is exceeded. When time is exceeded, we
+        # shrink the `radius`, which drives a time of exposing, later the
+        # `grain`, which drives a time of visiting pixels, and at last we
+        # limit a number of exposers. Radius never falls below a single
+        # quant. If nothing fits, `None` is returned.
+        configuration = {
+            'approach': approach,
+            'dimensions': dimensions,
+            'grain': grain,
+            'radius': radius,
+            'limit': limit,
+            'pool': pool,
+            'resample': resample
+        }
+        if approach == 1:
+            configuration['limit'] = sum(
+                self.combinations(dimension) for dimension in dimensions)
+
+        while True:
+            plan = self.estimate(**configuration)
+            if self.fits(plan, memory, time):
+                return configuration
+
+            quants = int(configuration['radius'] * configuration['grain'])
+            overflow = memory is not None and plan['memory'] > memory
+            if overflow and configuration['grain'] > 2:
+                self.lowerGrain(configuration)
+            elif not overflow and quants > 1:
+                configuration['radius'] = \
+                    (quants - .5) / configuration['grain']
+            elif not overflow and configuration['grain'] > 2:
+                self.lowerGrain(configuration)
+            elif configuration['limit'] > 1:
+                # Limiting brutal ensemble turns it into a random one.
+                configuration['approach'] = approach if approach != 1 else 2
+                configuration['limit'] -= 1
+            else:
+                return None
+
+    # ==== Helpers ====
+    def compilation(self, *names):
+        # Time of compiling given numba kernels, which were never called.
+        if self.backend != Kernels.ExposerBackend.numba.value:
+            return 0.
+        return sum(
+            COMPILE for name in names
+            if not getattr(Kernels, name).signatures)
+
+    def lowerGrain(self, configuration):
+        # Grain is lowered by a single quant, keeping radius of at least one.
+        configuration['grain'] -= 1
+        if int(configuration['radius'] * configuration['grain']) < 1:
+            configuration['radius'] = 1.5 / configuration['grain']
+
+    def members(self, dimensions, grain, radius, resample):
+        # Estimates of exposers for every dimensionality, paired with a
+        # number of possible combinations.
+        return [
+            (self.combinations(dimension),
+             self.exposer(dimension, grain, radius, resample))
+            for dimension in dimensions
+            if self.combinations(dimension) > 0]
+
+    def largest(self, members, limit):
+        # The most expensive `limit` exposers from all possible ones.
+        chosen = []
+        for count, member in sorted(
+                members, key=lambda m: m[1]['memory'], reverse=True):
+            count = min(count, limit)
+            if count > 0:
+                chosen.append((count, member))
+            limit -= count
+        return chosen
+
+    def combinations(self, dimension):
+        # Number of `dimension`-element combinations of features.
+        if dimension > self.features:
+            return 0
+        return reduce(
+            operator.mul,
+            xrange(self.features - dimension + 1, self.features + 1), 1) // \
+            math.factorial(dimension)
@@ -1,2 +1,4 @@
 from .Exposer import *
 from .ECE import *
+from .Planner import *
+from .Kernels import *
@@ -18,5 +18,6 @@ setup(
     url='https://github.com/w4k2/ece',
     package_data={'': ['LICENSE']},
     license=license,
-    packages=find_packages(exclude=('docs', 'tests', 'README.md'))
+    packages=find_packages(exclude=('docs', 'tests', 'README.md')),
+    extras_require={'numba': ['numba<0.48']}
 )
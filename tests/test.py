@@ -5,8 +5,16 @@ from ece import ECE
 
 from ece import ExposerVotingMethod
 from ece import ECEApproach
+from ece import Planner
+from ece import ExposerBackend
+from ece import Kernels
 
 import numpy as np
+import random
+import time
+import glob
+
+from nose.plugins.skip import SkipTest
 
 def blue():
     return "\033[92m"
@@ -47,3 +55,148 @@ def test_ensemble():
 
             print  "\t%sBAC = %.3f%s" % (blue(), scores['bac'], endcolor())
             assert np.isnan(scores['accuracy']) == False
+
+def test_cascade():
+    """Do cascade prediction agree with a complete ensemble?"""
+    dataset = Dataset('data/iris.csv')
+    dataset.setCV(0)
+    print "\n"
+
+    for votingMethod in [1, 2, 3, 4, 5]:
+        ensemble = ECE(dataset, votingMethod = votingMethod, resample = 250)
+        ensemble.learn()
+
+        ensemble.predict()
+        predictions = [sample.prediction for sample in dataset.test]
+        queries = ensemble.queries
+
+        ensemble.predict(cascade = True)
+        cascade_predictions = [sample.prediction for sample in dataset.test]
+
+        print "\t%sQUERIES = %i / %i%s" % (blue(), ensemble.queries, queries, endcolor())
+        assert cascade_predictions == predictions
+        assert ensemble.queries < queries
+
+def test_prune():
+    """Do pruning keep accuracy within tolerance?"""
+    dataset = Dataset('data/iris.csv')
+    dataset.setCV(0)
+    tolerance = .05
+
+    ensemble = ECE(dataset, resample = 250)
+    ensemble.learn(validation = .2)
+    size = len(ensemble.exposers)
+
+    labels = np.array([sample.label for sample in ensemble.validation])
+    support = sum(exposer.votes(ensemble.validation) for exposer in ensemble.exposers)
+    baseline = np.mean(np.argmax(support, axis = 1) == labels)
+
+    accuracy = ensemble.prune(tolerance = tolerance)
+
+    print "\n\t%sEXPOSERS = %i / %i%s" % (blue(), len(ensemble.exposers), size, endcolor())
+    assert accuracy >= baseline - tolerance
+    assert ensemble.combinations == [exposer.chosenLambda for exposer in ensemble.exposers]
+
+    ensemble.predict()
+    scores = dataset.score()
+    assert np.isnan(scores['accuracy']) == False
+
+    ensemble.learn()
+    try:
+        ensemble.prune()
+        assert False
+    except ValueError:
+        pass
+
+def test_planner():
+    """Do planner fit configuration into budget?"""
+    dataset = Dataset('data/iris.csv')
+    dataset.setCV(0)
+
+    planner = Planner.fromDataset(dataset)
+    plan = planner.estimate(dimensions = [2, 3], grain = 20)
+    assert plan['exposers'] == 10
+    points, drops = planner.stencil(2, 20, .25)
+    assert (points, drops) == (11 ** 2, 78)
+    points, drops = planner.stencil(3, 20, .25)
+    assert plan['memory'] == 6 * (20 ** 2 * 6 * 8 + 78 * 3 * 8) + 4 * (20 ** 3 * 6 * 8 + drops * 4 * 8) + points * 9 * 8
+
+    configuration = planner.fit(memory = plan['memory'] / 4, dimensions = [2, 3], grain = 20)
+    assert configuration['grain'] < 20
+    assert planner.fits(planner.estimate(**configuration), memory = plan['memory'] / 4)
+
+    try:
+        ECE(dataset, dimensions = [2, 3], memory = 1024)
+        assert False
+    except ValueError:
+        pass
+
+    ensemble = ECE(dataset, dimensions = [2, 3], memory = plan['memory'] / 4, downscale = True)
+    assert ensemble.grain < 20
+
+    # Kernels are compiled before anything is timed.
+    warmup = ECE(dataset)
+    warmup.learn()
+    warmup.predict()
+    planner = Planner.fromDataset(dataset)
+
+    ensemble = ECE(dataset, dimensions = [3], grain = 40)
+    plan = ensemble.plan()
+    planned = plan['training'] + plan['prediction']
+    start = time.time()
+    ensemble.learn()
+    ensemble.predict()
+    elapsed = time.time() - start
+    print "\n\t%sTIME = %.3f / %.3f%s" % (blue(), elapsed, planned, endcolor())
+    assert planned / 10 < elapsed < planned * 10
+
+    configuration = planner.fit(time = .01, dimensions = [2, 3], grain = 20)
+    assert configuration is not None
+    assert planner.fits(planner.estimate(**configuration), time = .01)
+
+    ensemble = ECE(dataset, dimensions = [2, 3], time = .01, downscale = True)
+    start = time.time()
+    ensemble.learn()
+    ensemble.predict()
+    assert time.time() - start < .01 * 10
+
+def test_backends():
+    """Do compiled kernels build the same models as reference ones?"""
+    if Kernels.numba is None:
+        raise SkipTest('numba is not installed')
+
+    for filename in sorted(glob.glob('data/*.csv')):
+        dataset = Dataset(filename)
+        dataset.setCV(0)
+
+        for chosenLambda in [[0], [0, 1], [0, 1, 2]]:
+            if len(chosenLambda) > dataset.features:
+                continue
+            exposers = [
+                Exposer(dataset, chosenLambda = chosenLambda, grain = 10, votingMethod = 5, backend = backend)
+                for backend in [ExposerBackend.numpy, ExposerBackend.numba]]
+            for exposer in exposers:
+                exposer.learn()
+
+            reference, compiled = exposers
+            np.testing.assert_array_equal(reference.offsets, compiled.offsets)
+            np.testing.assert_array_equal(reference.influences, compiled.influences)
+            np.testing.assert_array_equal(reference.model, compiled.model)
+            np.testing.assert_array_equal(reference.hsv, compiled.hsv)
+            np.testing.assert_array_equal(reference.thetas, compiled.thetas)
+            np.testing.assert_array_equal(reference.votes(dataset.test), compiled.votes(dataset.test))
+
+def test_jobs():
+    """Do parallel learning build the same ensemble?"""
+    dataset = Dataset('data/iris.csv')
+    dataset.setCV(0)
+
+    ensemble = ECE(dataset, resample = 50)
+    random.seed(0)
+    ensemble.learn()
+    models = [exposer.model for exposer in ensemble.exposers]
+
+    random.seed(0)
+    ensemble.learn(jobs = 4)
+    for model, exposer in zip(models, ensemble.exposers):
+        np.testing.assert_array_equal(model, exposer.model)